@@ -4,17 +4,26 @@ Security News Bot
 RSS → Groq (краткое резюме на русском) → gTTS → RVC (Каневский) → Telegram
 """
 
+import calendar
+import hashlib
+import io
 import os
+import queue
+import re
+import shutil
+import threading
 import time
-import subprocess
 import tempfile
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from datetime import datetime, timezone, timedelta
 from pathlib import Path
 
 import feedparser
+import orjson
 import requests
-from groq import Groq
+from requests.adapters import HTTPAdapter
 from gtts import gTTS
 
 # ─── Конфигурация ────────────────────────────────────────────────────────────
@@ -29,7 +38,11 @@ FEEDS = {
 
 MAX_ARTICLES_PER_BLOG = 2  # максимум статей с одного блога
 LOOKBACK_HOURS        = 24  # смотрим за последние N часов
+SIMHASH_MAX_DISTANCE  = 5   # статьи с SimHash ближе этого — одна и та же новость
 MODEL_CACHE_DIR       = Path.home() / ".rvc_models" / "kanevsky"
+DOWNLOAD_CHUNK_SIZE   = 1 << 20  # 1 МиБ на чтение при скачивании модели
+FEED_CACHE_PATH       = MODEL_CACHE_DIR.parent / "feed_cache.json"  # ETag/Last-Modified фидов
+MODEL_PATHS_FILE      = MODEL_CACHE_DIR / "paths.json"  # найденные .pth/.index, без повторных glob
 
 # Из GitHub Secrets
 GROQ_API_KEY    = os.environ["GROQ_API_KEY"]
@@ -37,31 +50,79 @@ TG_TOKEN        = os.environ["TELEGRAM_TOKEN"]
 TG_CHAT_ID      = os.environ["TELEGRAM_CHAT_ID"]
 HF_MODEL_URL    = os.environ.get("HF_MODEL_URL", "")  # URL zip с моделью
 
+GROQ_MODEL = "llama-3.3-70b-versatile"
+
+# Один клиент на весь запуск — без повторного TLS-рукопожатия на каждый вызов.
+# Создаётся лениво: в запусках без новых статей groq даже не импортируется.
+_groq_client = None
+_GROQ_LOCK = threading.Lock()
+
+# Общая HTTP-сессия: keep-alive и пул соединений для Telegram и загрузки модели
+_HTTP = requests.Session()
+_HTTP.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=3))
+
 
 # ─── RSS: получение новых статей ─────────────────────────────────────────────
 
-def get_recent_articles(feed_url: str) -> list[dict]:
-    """Возвращает статьи опубликованные за последние LOOKBACK_HOURS часов."""
+def load_feed_cache() -> dict:
+    """{feed_url: {"etag": ..., "modified": ...}} с прошлого запуска."""
     try:
-        feed = feedparser.parse(feed_url)
+        return orjson.loads(FEED_CACHE_PATH.read_bytes())
+    except (OSError, orjson.JSONDecodeError):
+        return {}
+
+
+def save_feed_cache(cache: dict):
+    FEED_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    FEED_CACHE_PATH.write_bytes(orjson.dumps(cache))
+
+
+def _entry_ts(entry) -> int | None:
+    """Время публикации статьи как UNIX timestamp (UTC) или None."""
+    val = entry.get("published_parsed") or entry.get("updated_parsed")
+    return calendar.timegm(val) if val else None
+
+
+def get_recent_articles(feed_url: str, cache: dict) -> list[dict]:
+    """
+    Возвращает статьи опубликованные за последние LOOKBACK_HOURS часов.
+    Условный GET по ETag/Last-Modified из cache; cache обновляется на месте.
+    """
+    cached = cache.get(feed_url, {})
+    try:
+        feed = feedparser.parse(feed_url, etag=cached.get("etag"), modified=cached.get("modified"))
     except Exception as e:
         print(f"  [RSS] Ошибка парсинга {feed_url}: {e}")
         return []
 
-    cutoff = datetime.now(timezone.utc) - timedelta(hours=LOOKBACK_HOURS)
+    if feed.get("etag") or feed.get("modified"):
+        cache[feed_url] = {"etag": feed.get("etag"), "modified": feed.get("modified")}
+
+    if feed.get("status") == 304:
+        # Фид не менялся с прошлого запуска — сервер не прислал тело
+        return []
+
+    cutoff_ts = (datetime.now(timezone.utc) - timedelta(hours=LOOKBACK_HOURS)).timestamp()
+    entries = feed.entries
     articles = []
 
-    for entry in feed.entries:
-        pub = None
-        for attr in ("published_parsed", "updated_parsed"):
-            val = getattr(entry, attr, None)
-            if val:
-                pub = datetime(*val[:6], tzinfo=timezone.utc)
-                break
+    # Обычно фид отсортирован от новых к старым — тогда после первой старой
+    # статьи дальше смотреть нет смысла. Проверяем это по краям списка.
+    newest_first = False
+    if len(entries) > 1:
+        first, last = _entry_ts(entries[0]), _entry_ts(entries[-1])
+        newest_first = first is not None and last is not None and first >= last
 
-        if pub is None or pub < cutoff:
+    for entry in entries:
+        pub_ts = _entry_ts(entry)
+        if pub_ts is None:
+            continue
+        if pub_ts < cutoff_ts:
+            if newest_first:
+                break
             continue
 
+        pub = datetime.fromtimestamp(pub_ts, tz=timezone.utc)
         articles.append({
             "title":   entry.get("title", "Без заголовка").strip(),
             "link":    entry.get("link", ""),
@@ -75,12 +136,56 @@ def get_recent_articles(feed_url: str) -> list[dict]:
     return articles
 
 
+# ─── Дедупликация: одна новость в нескольких блогах ──────────────────────────
+
+def simhash(text: str) -> int:
+    """64-битный SimHash по символьным 4-граммам."""
+    text = " ".join(text.lower().split())
+    weights = [0] * 64
+    for i in range(max(len(text) - 3, 1)):
+        h = int.from_bytes(hashlib.blake2b(text[i:i + 4].encode(), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+
+def dedupe_articles(results: dict[str, list[dict]]) -> dict[str, list[dict]]:
+    """
+    Убирает почти одинаковые статьи из разных блогов (заголовок + начало текста).
+    Из похожих остаётся самая свежая; порядок блогов и статей не меняется.
+    """
+    pairs = [(blog_name, a) for blog_name, articles in results.items() for a in articles]
+    pairs.sort(key=lambda p: p[1]["pub"], reverse=True)
+
+    seen: list[int] = []
+    keep = set()
+    for blog_name, article in pairs:
+        h = simhash(f"{article['title']} {article['content'][:200]}")
+        if any(bin(h ^ s).count("1") <= SIMHASH_MAX_DISTANCE for s in seen):
+            print(f"  [Dedup] {blog_name}: {article['title'][:70]} — уже есть похожая")
+            continue
+        seen.append(h)
+        keep.add(id(article))
+
+    return {
+        blog_name: [a for a in articles if id(a) in keep]
+        for blog_name, articles in results.items()
+    }
+
+
 # ─── Groq: краткое резюме на русском ─────────────────────────────────────────
 
+def groq_client():
+    global _groq_client
+    with _GROQ_LOCK:
+        if _groq_client is None:
+            from groq import Groq
+            _groq_client = Groq(api_key=GROQ_API_KEY)
+        return _groq_client
+
+
 def summarize_to_russian(title: str, content: str) -> str:
     """3 предложения по-русски — кратко и понятно."""
-    client = Groq(api_key=GROQ_API_KEY)
-
     prompt = (
         "Ты — диктор новостей кибербезопасности. "
         "Напиши краткое резюме этой статьи НА РУССКОМ языке — ровно 3 предложения. "
@@ -91,8 +196,8 @@ def summarize_to_russian(title: str, content: str) -> str:
     )
 
     try:
-        resp = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
+        resp = groq_client().chat.completions.create(
+            model=GROQ_MODEL,
             messages=[{"role": "user", "content": prompt}],
             max_tokens=300,
             temperature=0.4,
@@ -103,40 +208,171 @@ def summarize_to_russian(title: str, content: str) -> str:
         return f"Новая статья: {title}"
 
 
+def summarize_batch(articles: list[dict]) -> list[str | None]:
+    """
+    Резюме для всех статей одним запросом к Groq (JSON-режим).
+    Модель заодно отмечает статьи про ту же новость, что и одна из предыдущих:
+    для таких вместо резюме возвращается None.
+    Статьи, для которых ответ не удалось разобрать, добираются поштучно.
+    """
+    if not articles:
+        return []
+
+    blocks = "\n\n".join(
+        f"Статья {i}\nЗаголовок: {a['title']}\nТекст: {a['content']}"
+        for i, a in enumerate(articles, 1)
+    )
+    prompt = (
+        "Ты — диктор новостей кибербезопасности. "
+        "Для каждой из статей ниже напиши краткое резюме НА РУССКОМ языке — ровно 3 предложения. "
+        "Простым языком, без технического жаргона, без вступлений вроде 'Вот резюме:'. "
+        "Если статья рассказывает о той же новости, что и одна из статей выше по списку, "
+        "не пиши для неё резюме, а укажи номер той статьи в поле duplicate_of. "
+        "Ответь JSON-объектом вида "
+        '{"summaries": [{"id": 1, "summary": "..."}, {"id": 2, "duplicate_of": 1}]} '
+        "— по одному элементу на каждую статью.\n\n"
+        f"{blocks}"
+    )
+
+    parsed: dict[int, str | None] = {}
+    try:
+        resp = groq_client().chat.completions.create(
+            model=GROQ_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=320 * len(articles),
+            temperature=0.4,
+            response_format={"type": "json_object"},
+        )
+        for item in orjson.loads(resp.choices[0].message.content).get("summaries", []):
+            i = int(item.get("id", 0))
+            dup = item.get("duplicate_of")
+            summary = str(item.get("summary") or "").strip()
+            if isinstance(dup, int) and 1 <= dup < i:
+                parsed[i] = None
+            elif summary:
+                parsed[i] = summary
+    except Exception as e:
+        print(f"  [Groq] Ошибка пакетного запроса: {e}")
+
+    summaries = []
+    for i, a in enumerate(articles, 1):
+        if i not in parsed:
+            print(f"  [Groq] Нет резюме для #{i} в пакете → отдельный запрос")
+            parsed[i] = summarize_to_russian(a["title"], a["content"])
+        summaries.append(parsed[i])
+    return summaries
+
+
 # ─── gTTS: текст → mp3 ───────────────────────────────────────────────────────
 
-def tts_to_mp3(text: str, out_path: str):
-    """Синтез речи на русском через Google TTS."""
+TTS_MAX_WORKERS = 4  # параллельных запросов к Google TTS на одну статью
+
+
+def _tts_sentence(text: str) -> bytes:
     tts = gTTS(text=text, lang="ru", slow=False)
-    tts.save(out_path)
+    buf = io.BytesIO()
+    tts.write_to_fp(buf)
+    return buf.getvalue()
+
+
+def tts_to_mp3(text: str) -> bytes:
+    """
+    Синтез речи на русском через Google TTS, mp3 в памяти.
+    gTTS сам режет текст на куски и запрашивает их по очереди, поэтому
+    предложения синтезируем параллельно и склеиваем — mp3-кадры склеиваются
+    как есть, gTTS делает то же самое внутри.
+    """
+    sentences = [p for p in re.split(r"(?<=[.!?])\s+", text.strip()) if p]
+    if len(sentences) <= 1:
+        return _tts_sentence(text)
+
+    with ThreadPoolExecutor(max_workers=min(len(sentences), TTS_MAX_WORKERS)) as ex:
+        return b"".join(ex.map(_tts_sentence, sentences))
+
+
+AUDIO_RATE = 22050  # моно 22.05 кГц — для речи достаточно
+
+
+def _transcode(src, dst, dst_format: str, codec: str, bit_rate: int | None = None):
+    """
+    Перекодирует аудио в моно AUDIO_RATE через PyAV — внутри процесса,
+    без запуска ffmpeg на каждую статью. src/dst — путь или file-like.
+    """
+    import av
+
+    with av.open(src) as inp, av.open(dst, "w", format=dst_format) as out:
+        stream = out.add_stream(codec, rate=AUDIO_RATE, layout="mono")
+        if bit_rate:
+            stream.bit_rate = bit_rate
+        resampler = av.AudioResampler(format=stream.format, layout=stream.layout, rate=AUDIO_RATE)
+
+        for frame in inp.decode(audio=0):
+            for resampled in resampler.resample(frame):
+                out.mux(stream.encode(resampled))
+        for resampled in resampler.resample(None):  # хвост ресемплера
+            out.mux(stream.encode(resampled))
+        out.mux(stream.encode(None))  # хвост энкодера
+
+
+def mp3_to_wav(mp3: bytes, wav_path: str):
+    """mp3 из памяти → wav для RVC (без mp3 на диске)."""
+    _transcode(io.BytesIO(mp3), wav_path, "wav", "pcm_s16le")
+
+
+def wav_to_mp3(wav_path: str) -> bytes:
+    """wav → mp3 64 кбит/с в памяти."""
+    buf = io.BytesIO()
+    _transcode(wav_path, buf, "mp3", "libmp3lame", bit_rate=64000)
+    return buf.getvalue()
 
 
 # ─── RVC: смена голоса на Каневского ─────────────────────────────────────────
 
+def _save_model_paths(pth_files: list[Path], index_files: list[Path]) -> tuple[str, str]:
+    """Запоминает найденные файлы модели в MODEL_PATHS_FILE и возвращает их."""
+    pth, index = str(pth_files[0].resolve()), str(index_files[0].resolve()) if index_files else ""
+    MODEL_PATHS_FILE.write_bytes(orjson.dumps({"pth": pth, "index": index}))
+    return pth, index
+
+
 def download_model_if_needed() -> tuple[str, str]:
     """
     Скачивает ZIP с моделью (один раз, затем кэш).
     Возвращает (путь к .pth, путь к .index или '').
     """
+    try:
+        paths = orjson.loads(MODEL_PATHS_FILE.read_bytes())
+        if Path(paths["pth"]).exists() and (not paths["index"] or Path(paths["index"]).exists()):
+            print(f"  [RVC] Модель в кэше: {paths['pth']}")
+            return paths["pth"], paths["index"]
+    except (OSError, KeyError, TypeError, orjson.JSONDecodeError):
+        pass  # sidecar нет или он устарел — ищем заново
+
     MODEL_CACHE_DIR.mkdir(parents=True, exist_ok=True)
     pth_files   = list(MODEL_CACHE_DIR.glob("*.pth"))
     index_files = list(MODEL_CACHE_DIR.glob("*.index"))
 
     if pth_files:
         print(f"  [RVC] Модель в кэше: {pth_files[0]}")
-        return str(pth_files[0]), str(index_files[0]) if index_files else ""
+        return _save_model_paths(pth_files, index_files)
 
     print(f"  [RVC] Скачиваю модель с {HF_MODEL_URL}...")
     zip_path = MODEL_CACHE_DIR / "model.zip"
 
-    r = requests.get(HF_MODEL_URL, stream=True, timeout=120)
-    r.raise_for_status()
-    with open(zip_path, "wb") as f:
-        for chunk in r.iter_content(8192):
-            f.write(chunk)
-
-    with zipfile.ZipFile(zip_path) as zf:
-        zf.extractall(MODEL_CACHE_DIR)
+    # Модель весит сотни МБ — в память не грузим, копируем сокет в файл
+    # C-циклом copyfileobj блоками по 1 МиБ
+    with _HTTP.get(HF_MODEL_URL, stream=True, timeout=120) as r:
+        r.raise_for_status()
+        r.raw.decode_content = True
+        with open(zip_path, "wb") as f:
+            shutil.copyfileobj(r.raw, f, length=DOWNLOAD_CHUNK_SIZE)
+
+    with open(zip_path, "rb") as f:
+        if hasattr(os, "posix_fadvise"):
+            # Подсказка ядру: читаем последовательно, можно агрессивнее read-ahead
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        with zipfile.ZipFile(f) as zf:
+            zf.extractall(MODEL_CACHE_DIR)
     zip_path.unlink()
 
     pth_files   = list(MODEL_CACHE_DIR.rglob("*.pth"))
@@ -145,63 +381,98 @@ def download_model_if_needed() -> tuple[str, str]:
     if not pth_files:
         raise FileNotFoundError("В ZIP не найден .pth файл модели")
 
-    return str(pth_files[0]), str(index_files[0]) if index_files else ""
+    return _save_model_paths(pth_files, index_files)
 
 
-def apply_rvc(mp3_in: str, mp3_out: str, model_pth: str, model_index: str):
-    """mp3 → wav → RVC (Каневский) → mp3."""
+def load_rvc(model_pth: str, model_index: str):
+    """Загружает RVC-модель один раз на весь запуск (на GPU, если он есть)."""
+    import torch
     from rvc_python.infer import RVCInference
 
-    # mp3 → wav через ffmpeg
-    wav_in  = mp3_in.replace(".mp3", "_in.wav")
-    wav_out = mp3_in.replace(".mp3", "_rvc.wav")
+    # Если по HF_MODEL_URL лежит int8-модель (quantize_dynamic), её слои
+    # должны уйти в fbgemm — на x86 он использует VNNI-инструкции
+    if "fbgemm" in torch.backends.quantized.supported_engines:
+        torch.backends.quantized.engine = "fbgemm"
+    # Инференс идёт строго по одному, так что отдаём ему все ядра раннера
+    torch.set_num_threads(os.cpu_count() or 1)
+
+    def load(device: str):
+        rvc = RVCInference(device=device)
+        rvc.load_model(model_pth)
+        if model_index:
+            rvc.index_path = model_index
+        return rvc
+
+    if torch.cuda.is_available():
+        # Длины входов у резюме из 3 предложений похожи — автоподбор свёрток окупается
+        torch.backends.cudnn.benchmark = True
+        try:
+            return load("cuda:0")
+        except RuntimeError as e:
+            print(f"  [RVC] Не удалось загрузить на GPU: {e} → CPU")
 
-    subprocess.run(
-        ["ffmpeg", "-y", "-i", mp3_in, wav_in],
-        check=True, capture_output=True
-    )
+    return load("cpu")
 
-    # RVC inference
-    rvc = RVCInference(device="cpu")
-    rvc.load_model(model_pth)
-    if model_index:
-        rvc.index_path = model_index
-    rvc.infer_file(wav_in, wav_out)
-
-    # wav → mp3
-    subprocess.run(
-        ["ffmpeg", "-y", "-i", wav_out, "-codec:a", "libmp3lame", "-qscale:a", "4", mp3_out],
-        check=True, capture_output=True
-    )
 
-    # Чистим временные wav
-    for f in [wav_in, wav_out]:
-        if os.path.exists(f):
-            os.unlink(f)
+def apply_rvc(wav_in: str, rvc) -> bytes:
+    """wav → RVC (Каневский) → mp3 в памяти."""
+    wav_out = wav_in.replace(".wav", "_rvc.wav")
+
+    try:
+        # RVC inference
+        rvc.infer_file(wav_in, wav_out)
+
+        return wav_to_mp3(wav_out)
+    finally:
+        # Чистим временный wav
+        if os.path.exists(wav_out):
+            os.unlink(wav_out)
 
 
 # ─── Telegram ────────────────────────────────────────────────────────────────
 
+class RateLimiter:
+    """Не чаще rate вызовов в секунду; спит, только если интервал ещё не прошёл."""
+
+    def __init__(self, rate: float = 1.0):
+        self.rate = rate
+        self.last = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            wait = self.last + 1 / self.rate - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self.last = time.monotonic()
+
+
+# Лимит Telegram — ~1 сообщение в секунду на чат, берём с запасом
+_TG_LIMIT = RateLimiter(rate=0.8)
+
+
 def tg_send_text(text: str):
+    _TG_LIMIT.acquire()
     url = f"https://api.telegram.org/bot{TG_TOKEN}/sendMessage"
-    requests.post(url, json={
+    payload = {
         "chat_id": TG_CHAT_ID,
         "text": text,
         "parse_mode": "HTML",
         "disable_web_page_preview": True,
-    }, timeout=30)
+    }
+    _HTTP.post(url, data=orjson.dumps(payload), headers={"Content-Type": "application/json"}, timeout=30)
 
 
-def tg_send_audio(title: str, link: str, audio_path: str):
+def tg_send_audio(title: str, link: str, audio: bytes):
+    _TG_LIMIT.acquire()
     url = f"https://api.telegram.org/bot{TG_TOKEN}/sendAudio"
     caption = f"<b>{title}</b>\n\n🔗 <a href='{link}'>Читать полностью</a>"
 
-    with open(audio_path, "rb") as f:
-        resp = requests.post(url, data={
-            "chat_id": TG_CHAT_ID,
-            "caption": caption,
-            "parse_mode": "HTML",
-        }, files={"audio": ("news.mp3", f, "audio/mpeg")}, timeout=60)
+    resp = _HTTP.post(url, data={
+        "chat_id": TG_CHAT_ID,
+        "caption": caption,
+        "parse_mode": "HTML",
+    }, files={"audio": ("news.mp3", io.BytesIO(audio), "audio/mpeg")}, timeout=60)
 
     if not resp.ok:
         print(f"  [TG] Ошибка отправки аудио: {resp.text[:200]}")
@@ -209,84 +480,191 @@ def tg_send_audio(title: str, link: str, audio_path: str):
         tg_send_text(f"📄 <b>{title}</b>\n\n🔗 {link}")
 
 
+# ─── Конвейер TTS → RVC → Telegram ───────────────────────────────────────────
+
+PIPELINE_QUEUE_SIZE = 2  # сколько заданий может ждать между стадиями
+
+# RVCInference нагружает CPU и не реентерабелен — инференс строго по одному
+_RVC_LOCK = threading.Lock()
+
+
+def run_stage(handler, inbox: queue.Queue, outbox: queue.Queue | None = None):
+    """
+    Воркер одной стадии конвейера: берёт задания из inbox, обрабатывает
+    handler и передаёт дальше в outbox. None в очереди — конец работы.
+    """
+    while True:
+        job = inbox.get()
+        if job is None:
+            break
+        try:
+            handler(job)
+        except Exception as e:
+            print(f"  [Конвейер] Ошибка на стадии {handler.__name__}: {e} → задание пропущено")
+            continue
+        if outbox is not None:
+            outbox.put(job)
+
+    if outbox is not None:
+        outbox.put(None)
+
+
 # ─── Главный цикл ────────────────────────────────────────────────────────────
 
+def preconnect():
+    """
+    Фоном открывает TLS-соединения к Telegram и Groq, пока грузится модель
+    RVC, — первые настоящие запросы уже идут по тёплому пулу.
+    """
+    def warm(name: str, call):
+        try:
+            call()
+        except Exception as e:
+            print(f"  [{name}] Прогрев соединения не удался: {e}")
+
+    # У Groq свой httpx-пул, поэтому греем его через сам клиент, а не _HTTP
+    for name, call in (
+        ("TG",   lambda: _HTTP.get(f"https://api.telegram.org/bot{TG_TOKEN}/getMe", timeout=10)),
+        ("Groq", lambda: groq_client().models.list()),
+    ):
+        threading.Thread(target=warm, args=(name, call), daemon=True).start()
+
+
 def main():
     print(f"=== Security News Bot — {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M UTC')} ===\n")
 
+    # RSS тянем параллельно: время загрузки = самый медленный фид, а не сумма
+    feed_cache = load_feed_cache()
+    fetch = partial(get_recent_articles, cache=feed_cache)
+    with ThreadPoolExecutor(max_workers=len(FEEDS)) as ex:
+        results = dict(zip(FEEDS, ex.map(fetch, FEEDS.values())))
+
+    # Частый случай — ничего нового: выходим, не загружая groq/torch/RVC
+    if not any(results.values()):
+        save_feed_cache(feed_cache)
+        print("Новых статей сегодня не найдено — бот молчит.")
+        return
+
+    preconnect()
+
+    results = dedupe_articles(results)
+
     # Загрузить модель RVC один раз (если настроена)
-    use_rvc    = bool(HF_MODEL_URL)
-    model_pth  = ""
-    model_index = ""
+    use_rvc = bool(HF_MODEL_URL)
+    rvc_model = None
 
     if use_rvc:
         try:
             model_pth, model_index = download_model_if_needed()
+            rvc_model = load_rvc(model_pth, model_index)
             print(f"[RVC] Модель готова: {model_pth}\n")
         except Exception as e:
             print(f"[RVC] Не удалось загрузить модель: {e} → используем gTTS без RVC\n")
             use_rvc = False
 
+    # Все резюме — одним запросом к Groq; дубликаты одной новости выкидываем
+    all_articles = [a for articles in results.values() for a in articles]
+    for article, summary in zip(all_articles, summarize_batch(all_articles)):
+        article["summary"] = summary
+        if summary is None:
+            print(f"  [Groq] Дубликат, пропускаем: {article['title'][:70]}")
+    results = {
+        blog_name: [a for a in articles if a["summary"] is not None]
+        for blog_name, articles in results.items()
+    }
+
     total_sent = 0
 
-    for blog_name, feed_url in FEEDS.items():
+    # Стадии конвейера. Задание — dict: либо {"text": ...} (заголовок блога,
+    # проходит насквозь до Telegram), либо {"article": ...} (статья).
+    # По одному воркеру на стадию, поэтому порядок сообщений сохраняется,
+    # а TTS статьи k+1 идёт одновременно с RVC статьи k и отправкой статьи k-1.
+
+    def tts(job: dict):
+        if "article" not in job:
+            return
+        article = job["article"]
+        # gTTS-mp3 — он же запасной вариант, если RVC не сработает
+        job["audio"] = tts_to_mp3(f"{article['title']}. {article['summary']}")
+
+        if use_rvc:
+            # Для RVC декодируем mp3 прямо из памяти
+            with tempfile.NamedTemporaryFile(suffix="_in.wav", delete=False) as tmp:
+                wav_path = tmp.name
+            try:
+                mp3_to_wav(job["audio"], wav_path)
+                job["wav_path"] = wav_path
+            except Exception as e:
+                os.unlink(wav_path)
+                print(f"  ffmpeg ошибка: {e} → gTTS без RVC")
+
+    def rvc(job: dict):
+        if "wav_path" not in job:
+            return
+        try:
+            with _RVC_LOCK:
+                job["audio"] = apply_rvc(job["wav_path"], rvc_model)
+            print(f"  RVC ✓ {job['article']['title'][:70]}")
+        except Exception as e:
+            print(f"  RVC ошибка: {e} → gTTS")
+        finally:
+            os.unlink(job["wav_path"])
+
+    # Отправка уже развязана с TTS/RVC своим потоком. Параллелить её дальше
+    # (пул из нескольких отправщиков) нельзя: перемешается порядок
+    # «заголовок блога → его статьи» в чате.
+    def send(job: dict):
+        nonlocal total_sent
+        if "text" in job:
+            tg_send_text(job["text"])
+            return
+
+        article = job["article"]
+        tg_send_audio(article["title"], article["link"], job["audio"])
+        total_sent += 1
+        print(f"  Отправлено в Telegram ✓ {article['title'][:70]}")
+
+    tts_q = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    rvc_q = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    tg_q  = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    workers = [
+        threading.Thread(target=run_stage, args=(tts, tts_q, rvc_q), daemon=True),
+        threading.Thread(target=run_stage, args=(rvc, rvc_q, tg_q), daemon=True),
+        threading.Thread(target=run_stage, args=(send, tg_q), daemon=True),
+    ]
+    for w in workers:
+        w.start()
+
+    date_str = datetime.now(timezone.utc).strftime("%d.%m.%Y")
+
+    for blog_name, articles in results.items():
         print(f"📰 {blog_name}")
-        articles = get_recent_articles(feed_url)
 
         if not articles:
             print("  Новых статей нет\n")
             continue
 
         # Заголовок блога в Telegram
-        date_str = datetime.now(timezone.utc).strftime("%d.%m.%Y")
-        tg_send_text(
+        tts_q.put({"text": (
             f"━━━━━━━━━━━━━━━━━━━━\n"
             f"{blog_name}\n"
             f"📅 {date_str} · {len(articles)} {'статья' if len(articles) == 1 else 'статьи'}"
-        )
-        time.sleep(1)
+        )})
 
         for article in articles:
-            title   = article["title"]
-            link    = article["link"]
-            content = article["content"]
-            print(f"  → {title[:70]}...")
-
-            # 1. Groq: краткое резюме
-            summary = summarize_to_russian(title, content)
-            print(f"     Резюме: {summary[:80]}...")
-
-            # 2. TTS (mp3)
-            with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as tmp:
-                tts_path = tmp.name
-
-            tts_to_mp3(f"{title}. {summary}", tts_path)
-
-            # 3. RVC (опционально)
-            audio_path = tts_path
-            if use_rvc:
-                rvc_path = tts_path.replace(".mp3", "_kanevsky.mp3")
-                try:
-                    apply_rvc(tts_path, rvc_path, model_pth, model_index)
-                    audio_path = rvc_path
-                    print("     RVC ✓")
-                except Exception as e:
-                    print(f"     RVC ошибка: {e} → gTTS")
-
-            # 4. Отправить в Telegram
-            tg_send_audio(title, link, audio_path)
-            total_sent += 1
-            print("     Отправлено в Telegram ✓")
-
-            # Чистим файлы
-            for f in [tts_path, audio_path]:
-                if os.path.exists(f):
-                    os.unlink(f)
-
-            time.sleep(2)  # пауза между сообщениями
+            print(f"  → {article['title'][:70]}...")
+            print(f"     Резюме: {article['summary'][:80]}...")
+            tts_q.put({"article": article})
 
         print()
 
+    tts_q.put(None)
+    for w in workers:
+        w.join()
+
+    # Сохраняем ETag только после отправки, чтобы упавший запуск не потерял статьи
+    save_feed_cache(feed_cache)
+
     if total_sent == 0:
         print("Новых статей сегодня не найдено — бот молчит.")
     else: